@@ -1,27 +1,481 @@
+import asyncio
 import httpx
-import pandas as pd
-from typing import Optional
-from fastapi import FastAPI, Header
+import msgspec
+import orjson
+from aiolimiter import AsyncLimiter
+from cachetools import TLRUCache, TTLCache
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Iterable, Optional
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 import os
+import time
 
 # Optional API key for authenticated endpoints (historical trades)
 API_KEY = os.getenv("ASTER_API_KEY")
+_AUTH_HEADERS = {"X-MBX-APIKEY": API_KEY} if API_KEY else None
+
+BASE_URL = "https://fapi.asterdex.com"
+
+# Worker processes serving the app (python main.py and gunicorn both read this)
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+# Upstream endpoint paths, relative to BASE_URL
+KLINES_PATH = "/fapi/v1/klines"
+INDEX_PRICE_KLINES_PATH = "/fapi/v1/indexPriceKlines"
+MARK_PRICE_KLINES_PATH = "/fapi/v1/markPriceKlines"
+PRICE_PATH = "/fapi/v1/ticker/price"
+TICKER_24HR_PATH = "/fapi/v1/ticker/24hr"
+BOOK_TICKER_PATH = "/fapi/v1/ticker/bookTicker"
+DEPTH_PATH = "/fapi/v1/depth"
+TRADES_PATH = "/fapi/v1/trades"
+HISTORICAL_TRADES_PATH = "/fapi/v1/historicalTrades"
+AGG_TRADES_PATH = "/fapi/v1/aggTrades"
+PREMIUM_INDEX_PATH = "/fapi/v1/premiumIndex"
+FUNDING_RATE_PATH = "/fapi/v1/fundingRate"
+TIME_PATH = "/fapi/v1/time"
+
+
+# Share one client (and its keep-alive pool) across all requests
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.client = httpx.AsyncClient(
+        base_url=BASE_URL,
+        # Concurrent upstream calls multiplex over one connection
+        http2=True,
+        # Fail fast on connect (usually a dead pooled connection), allow slow reads
+        timeout=httpx.Timeout(10.0, connect=2.0, read=10.0, write=5.0, pool=5.0),
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100, keepalive_expiry=30),
+    )
+    # Pay DNS + TCP + TLS up front so the first user request finds a warm
+    # connection; an unreachable upstream must not stop the app from starting
+    try:
+        await app.state.client.get(TIME_PATH)
+    except httpx.HTTPError:
+        pass
+    yield
+    await app.state.client.aclose()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Aster Info API",
     description="Local FastAPI wrapper for Aster DEX market data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-BASE_URL = "https://fapi.asterdex.com"
+# Markdown tables are highly repetitive text and compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 # -------------------------- Utility --------------------------
-def to_md(df: pd.DataFrame):
-    if df.empty:
-        return "No data available."
-    return df.to_markdown(index=False)
+NO_DATA = "No data available."
+NO_DATA_BODY = orjson.dumps({"markdown": NO_DATA})
+
+
+def md_header(cols) -> str:
+    return "| " + " | ".join(cols) + " |\n|" + "|".join(["---"] * len(cols)) + "|\n"
+
+
+def rows_to_md(header: str, rows: Iterable) -> str:
+    # Tables are small, so plain string building beats any DataFrame round-trip.
+    # Row borders are added by the single outer join rather than per row
+    cells = [" | ".join(map(str, row)) for row in rows]
+    if not cells:
+        return NO_DATA
+    return header + "| " + " |\n| ".join(cells) + " |"
+
+
+def md_response(md: str) -> Response:
+    # Encode the payload once with orjson, bypassing FastAPI's jsonable_encoder
+    return Response(content=orjson.dumps({"markdown": md}), media_type="application/json")
+
+
+def dict_to_md(d: dict, header: str) -> str:
+    # Single-object responses render as a one-row table, the same layout the
+    # batch endpoints use for several symbols
+    return header + "| " + " | ".join(map(str, d.values())) + " |"
+
+
+def ms_to_str(ms: int) -> str:
+    # time.gmtime skips the tz-aware datetime construction; ~3x faster per call
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ms // 1000))
+
+
+def ms_to_str_ms(ms: int) -> str:
+    # Keeps the milliseconds so trades within the same second stay distinct
+    return ms_to_str(ms) + f".{ms % 1000:03d}"
+
+
+def records_to_md(records: list, keys: tuple, header: str, time_key: str, time_fmt=ms_to_str) -> str:
+    return rows_to_md(header, (
+        (time_fmt(rec[k]) if k == time_key else rec[k] for k in keys)
+        for rec in records
+    ))
+
+
+@dataclass(frozen=True)
+class RecordSpec:
+    # Output layout of a list-of-dicts endpoint: which upstream keys to emit (in
+    # order), the precomputed header, and the key holding a ms timestamp
+    keys: tuple
+    header: str
+    time_key: str
+    time_fmt: Callable[[int], str] = ms_to_str
+
+    def format(self, body: bytes) -> bytes:
+        data = orjson.loads(body)
+        if not data:
+            return NO_DATA_BODY
+        return orjson.dumps({"markdown": records_to_md(data, self.keys, self.header, self.time_key, self.time_fmt)})
+
+
+TRADE_SPEC = RecordSpec(
+    keys=("id", "price", "qty", "quoteQty", "time", "isBuyerMaker"),
+    header=md_header(("tradeId", "price", "qty", "quoteQty", "time", "isBuyerMaker")),
+    time_key="time",
+    time_fmt=ms_to_str_ms,
+)
+AGG_TRADE_SPEC = RecordSpec(
+    keys=("a", "p", "q", "f", "l", "T", "m"),
+    header=md_header(("aggTradeId", "price", "qty", "firstTradeId", "lastTradeId", "time", "isBuyerMaker")),
+    time_key="T",
+    time_fmt=ms_to_str_ms,
+)
+FUNDING_SPEC = RecordSpec(
+    keys=("symbol", "fundingTime", "fundingRate"),
+    header=md_header(("symbol", "fundingTime", "fundingRate")),
+    time_key="fundingTime",
+)
+
+
+KLINE_MD_HEADER = "| open_time | open | high | low | close |\n|---|---|---|---|---|\n"
+
+
+class Kline(msgspec.Struct, array_like=True):
+    # Only the leading fields are declared; the trailing ones are skipped while decoding
+    open_time: int
+    open: str
+    high: str
+    low: str
+    close: str
+
+
+_kline_decoder = msgspec.json.Decoder(list[Kline])
+
+
+# Parsing + formatting of large kline/depth payloads can block the event loop
+# for tens of ms, so above this many rows it runs in a worker thread instead
+OFFLOAD_MIN_ROWS = 500
+
+
+def _format_kline(body: bytes) -> bytes:
+    rows = ((ms_to_str(k.open_time), k.open, k.high, k.low, k.close) for k in _kline_decoder.decode(body))
+    return orjson.dumps({"markdown": rows_to_md(KLINE_MD_HEADER, rows)})
+
+
+ORDER_BOOK_MD_HEADER = md_header(("side", "price", "quantity"))
+
+
+def _format_order_book(body: bytes) -> bytes:
+    data = orjson.loads(body)
+    # Upstream already sorts bids high->low and asks low->high, so a single
+    # pass over each side is enough
+    rows = [f"| bid | {round(float(p), 8)} | {round(float(q), 8)} |" for p, q in data["bids"]]
+    rows += [f"| ask | {round(float(p), 8)} | {round(float(q), 8)} |" for p, q in data["asks"]]
+    if not rows:
+        return NO_DATA_BODY
+    return orjson.dumps({"markdown": ORDER_BOOK_MD_HEADER + "\n".join(rows)})
+
+
+# Upstream kline rows always carry 12 positional fields
+RAW_KLINE_MD_HEADER = md_header([str(i) for i in range(12)])
+
+
+def _format_raw_head(body: bytes) -> bytes:
+    return orjson.dumps({"markdown": rows_to_md(RAW_KLINE_MD_HEADER, orjson.loads(body)[:5])})
+
+
+async def render(fmt, body: bytes, rows: int) -> bytes:
+    if rows >= OFFLOAD_MIN_ROWS:
+        return await asyncio.to_thread(fmt, body)
+    return fmt(body)
+
+
+# Client-side throttle for Aster's 2400 request-weight-per-minute IP limit; each
+# request takes its endpoint's weight (see _request_weight). Each worker process
+# has its own limiter, so the budget is split between them
+LIMITER = AsyncLimiter(max_rate=2400 / WORKERS, time_period=60)
+# Caps in-flight upstream requests so fan-out (batch endpoints, concurrent
+# clients) runs in parallel without exhausting the connection pool
+UPSTREAM_CONCURRENCY = asyncio.Semaphore(64)
+MAX_RETRIES = 3
+# Longest Retry-After we will sleep through while a caller is waiting
+MAX_RETRY_AFTER = 10.0
+
+
+# Upstream request weights: a fixed weight, or (limit, weight) steps where the
+# first step with limit >= the requested limit applies
+KLINE_WEIGHTS = ((99, 1), (499, 2), (1000, 5), (1500, 10))
+REQUEST_WEIGHTS = {
+    KLINES_PATH: KLINE_WEIGHTS,
+    INDEX_PRICE_KLINES_PATH: KLINE_WEIGHTS,
+    MARK_PRICE_KLINES_PATH: KLINE_WEIGHTS,
+    DEPTH_PATH: ((50, 2), (100, 5), (500, 10), (1000, 20)),
+    TRADES_PATH: 5,
+    HISTORICAL_TRADES_PATH: 20,
+    AGG_TRADES_PATH: 20,
+}
+# Ticker weights without a symbol filter (all symbols at once)
+ALL_SYMBOLS_WEIGHTS = {PRICE_PATH: 2, TICKER_24HR_PATH: 40, BOOK_TICKER_PATH: 5}
+
+
+def _request_weight(path: str, params) -> int:
+    params = dict(params or ())
+    if "symbol" not in params and path in ALL_SYMBOLS_WEIGHTS:
+        return ALL_SYMBOLS_WEIGHTS[path]
+    weight = REQUEST_WEIGHTS.get(path, 1)
+    if isinstance(weight, int):
+        return weight
+    limit = int(params.get("limit") or 0)
+    return next((w for top, w in weight if limit <= top), weight[-1][1])
+
+
+def _backoff(attempt: int) -> float:
+    return 2 ** attempt * 0.5
+
+
+def _retry_delay(r: httpx.Response, attempt: int) -> Optional[float]:
+    # None means give up now: a 418 is an IP ban, and a Retry-After longer than
+    # MAX_RETRY_AFTER would hold the caller's connection for that long
+    if r.status_code == 418:
+        return None
+    try:
+        delay = float(r.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return _backoff(attempt)
+    return delay if delay <= MAX_RETRY_AFTER else None
+
+
+def _rate_limited(r: httpx.Response) -> HTTPException:
+    # Upstream throttling surfaces as a retryable 503 rather than an opaque 500,
+    # passing Aster's Retry-After through so callers know how long to back off
+    retry_after = r.headers.get("Retry-After")
+    return HTTPException(
+        status_code=503,
+        detail=f"Upstream rate limit hit (HTTP {r.status_code}), retry later",
+        headers={"Retry-After": retry_after} if retry_after else None,
+    )
+
+
+async def upstream_get(path: str, params=None, headers=None) -> httpx.Response:
+    # Throttled GET that backs off and retries when Aster rate-limits us (429)
+    # or a request times out
+    # A single request can never exceed the limiter's whole budget
+    weight = min(_request_weight(path, params), LIMITER.max_rate)
+    read_retried = False
+    for attempt in range(MAX_RETRIES + 1):
+        last = attempt == MAX_RETRIES
+        try:
+            async with UPSTREAM_CONCURRENCY:
+                await LIMITER.acquire(weight)
+                r = await app.state.client.get(path, params=params, headers=headers)
+        except httpx.ConnectTimeout:
+            # Most likely a stale pooled connection, so retry straight away
+            if last:
+                raise
+            continue
+        except httpx.ReadTimeout:
+            # Upstream may already have processed (and charged for) the request,
+            # and every retry adds a full read timeout, so only retry once
+            if last or read_retried:
+                raise
+            read_retried = True
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        if r.status_code not in (418, 429):
+            return r
+        delay = None if last else _retry_delay(r, attempt)
+        if delay is None:
+            raise _rate_limited(r)
+        await asyncio.sleep(delay)
+
+
+# Per-endpoint cache lifetimes (seconds) for ticker-style data: prices barely
+# move within the TTL, so repeated identical requests share one upstream fetch
+CACHE_TTLS = {
+    PRICE_PATH: 1.0,
+    BOOK_TICKER_PATH: 1.0,
+    PREMIUM_INDEX_PATH: 2.0,
+    TICKER_24HR_PATH: 5.0,
+}
+_caches = {path: TTLCache(maxsize=1024, ttl=ttl) for path, ttl in CACHE_TTLS.items()}
+_inflight: dict = {}
+
+INTERVAL_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 604800, "M": 2592000}
+
+
+def _kline_ttl(interval: str) -> float:
+    # Only the open bar changes, so cache for a twelfth of the bar (5s for 1m
+    # bars) but never longer than a minute; unknown intervals are not cached
+    try:
+        seconds = int(interval[:-1]) * INTERVAL_UNIT_SECONDS[interval[-1]]
+    except (KeyError, ValueError):
+        return 0.0
+    return min(seconds / 12, 60.0)
+
+
+# Formatted kline bodies, keyed on (path, params) with an interval-aligned TTL
+_kline_cache = TLRUCache(maxsize=512, ttu=lambda key, value, now: now + _kline_ttl(dict(key[1])["interval"]))
+
+
+async def coalesce(key: tuple, fetch, cache=None):
+    # Concurrent callers for the same key share one in-flight fetch
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _store(cache, key, t))
+    return await asyncio.shield(task)
+
+
+async def cached(cache, key: tuple, fetch):
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+    return await coalesce(key, fetch, cache)
+
+
+def _store(cache, key: tuple, task: asyncio.Future):
+    _inflight.pop(key, None)
+    if cache is not None and not task.cancelled() and task.exception() is None:
+        cache[key] = task.result()
+
+
+async def fetch_table(path: str, params, fmt, rows: int, headers=None) -> Response:
+    # Shared fetch -> format pipeline behind every list endpoint. Nothing is
+    # cached, but identical requests already in flight share one upstream call
+    async def fetch():
+        r = await upstream_get(path, params, headers)
+        r.raise_for_status()
+        return await render(fmt, r.content, rows)
+
+    key = (fmt, path, tuple(params), tuple(headers.items()) if headers else None)
+    return Response(content=await coalesce(key, fetch), media_type="application/json")
+
+
+async def fetch_kline(path: str, params: tuple, limit: int) -> Response:
+    # Repeat hits within the TTL skip both the upstream call and the formatting
+    async def fetch():
+        r = await upstream_get(path, params)
+        r.raise_for_status()
+        return await render(_format_kline, r.content, limit)
+
+    content = await cached(_kline_cache, (path, params), fetch)
+    return Response(content=content, media_type="application/json")
+
+
+async def get_json(path: str, params: tuple):
+    # Parsed payload of a CACHE_TTLS endpoint, keyed on the endpoint and its params
+    async def fetch():
+        r = await upstream_get(path, params)
+        r.raise_for_status()
+        return orjson.loads(r.content)
+
+    return await cached(_caches[path], (path, params), fetch)
+
+
+async def _fetch_symbol(path: str, symbol: str) -> dict:
+    # Shared by the single and batch handlers of an endpoint
+    return await get_json(path, (("symbol", symbol),))
+
+
+async def _fetch_24h(symbol: str) -> dict:
+    return await _fetch_symbol(TICKER_24HR_PATH, symbol)
+
+
+async def _fetch_all_prices() -> dict:
+    # Every symbol's price from one upstream call, indexed by symbol. It shares
+    # the ticker/price cache, so concurrent callers collapse onto one request
+    async def fetch():
+        r = await upstream_get(PRICE_PATH)
+        r.raise_for_status()
+        return {d["symbol"]: d for d in orjson.loads(r.content)}
+
+    return await cached(_caches[PRICE_PATH], (PRICE_PATH, ()), fetch)
+
+
+async def _fetch_price(symbol: str) -> dict:
+    # A fresh all-symbols snapshot answers single-symbol lookups locally
+    snapshot = _caches[PRICE_PATH].get((PRICE_PATH, ()))
+    if snapshot is not None and symbol in snapshot:
+        return snapshot[symbol]
+    return await _fetch_symbol(PRICE_PATH, symbol)
+
+
+# Batch endpoints make one upstream call per symbol, so a single request must
+# not be able to spend the whole per-minute budget
+MAX_BATCH_SYMBOLS = 50
+
+
+def parse_symbols(symbols: str) -> list:
+    parsed = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if len(parsed) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SYMBOLS} symbols per request")
+    return parsed
+
+
+PRICE_MD_HEADER = md_header(("symbol", "price"))
+
+
+def _price_row(d: dict) -> dict:
+    return {"symbol": d["symbol"], "price": round(float(d["price"]), 8)}
+
+
+BOOK_TICKER_KEYS = ("symbol", "bidPrice", "bidQty", "askPrice", "askQty")
+BOOK_TICKER_MD_HEADER = md_header(BOOK_TICKER_KEYS)
+
+
+def _book_ticker_row(d: dict) -> dict:
+    return {k: d[k] for k in BOOK_TICKER_KEYS}
+
+
+TICKER_24H_MD_HEADER = md_header(("symbol", "priceChange", "priceChangePercent", "lastPrice", "volume"))
+
+
+def _ticker_24h_row(d: dict) -> dict:
+    return {
+        "symbol": d["symbol"],
+        "priceChange": d["priceChange"],
+        "priceChangePercent": round(float(d["priceChangePercent"]), 2),
+        "lastPrice": d["lastPrice"],
+        "volume": d["volume"],
+    }
+
+
+PREMIUM_MD_HEADER = md_header(("symbol", "markPrice", "indexPrice", "lastFundingRate", "nextFundingTime"))
+
+
+def _premium_row(d: dict) -> dict:
+    return {
+        "symbol": d["symbol"],
+        "markPrice": d["markPrice"],
+        "indexPrice": d["indexPrice"],
+        "lastFundingRate": d["lastFundingRate"],
+        "nextFundingTime": ms_to_str(d["nextFundingTime"]),
+    }
+
+
+async def _batch_md(fetch, symbols: str, row, header: str) -> str:
+    # Fan the per-symbol requests out concurrently over the shared client
+    results = await asyncio.gather(*(fetch(s) for s in parse_symbols(symbols)))
+    return rows_to_md(header, (row(d).values() for d in results))
 
 
 # -------------------------- Health Check --------------------------
@@ -33,115 +487,57 @@ async def health():
 # -------------------------- 1. get_kline --------------------------
 @app.get("/kline/{symbol}")
 async def get_kline(symbol: str, interval: str = "1h", limit: int = 2):
-    params = {"symbol": symbol.upper(), "interval": interval, "limit": limit}
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/klines", params=params)
-        r.raise_for_status()
-        data = r.json()
-        df = pd.DataFrame(data, columns=[
-            "open_time", "open", "high", "low", "close", "volume",
-            "close_time", "quote_asset_volume", "number_of_trades",
-            "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume", "ignore"
-        ])
-        df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
-        df = df[["open_time", "open", "high", "low", "close"]]
-        return {"markdown": to_md(df)}
+    params = (("symbol", symbol.upper()), ("interval", interval), ("limit", limit))
+    return await fetch_kline(KLINES_PATH, params, limit)
 
 
 # -------------------------- 2. get_index_price_kline --------------------------
 @app.get("/index_price_kline/{pair}")
 async def get_index_price_kline(pair: str, interval: str = "1h", limit: int = 2):
-    params = {"pair": pair.upper(), "interval": interval, "limit": limit}
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/indexPriceKlines", params=params)
-        r.raise_for_status()
-        df = pd.DataFrame(r.json(), columns=[
-            "open_time", "open", "high", "low", "close", "volume",
-            "close_time", "ignore1", "ignore2", "ignore3", "ignore4", "ignore5"
-        ])
-        df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
-        df = df[["open_time", "open", "high", "low", "close"]]
-        return {"markdown": to_md(df)}
+    params = (("pair", pair.upper()), ("interval", interval), ("limit", limit))
+    return await fetch_kline(INDEX_PRICE_KLINES_PATH, params, limit)
 
 
 # -------------------------- 3. get_mark_price_kline --------------------------
 @app.get("/mark_price_kline/{symbol}")
 async def get_mark_price_kline(symbol: str, interval: str = "1m", limit: int = 2):
-    params = {"symbol": symbol.upper(), "interval": interval, "limit": limit}
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/markPriceKlines", params=params)
-        r.raise_for_status()
-        df = pd.DataFrame(r.json(), columns=[
-            "open_time", "open", "high", "low", "close", "volume",
-            "close_time", "ignore1", "ignore2", "ignore3", "ignore4", "ignore5"
-        ])
-        df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
-        df = df[["open_time", "open", "high", "low", "close"]]
-        return {"markdown": to_md(df)}
+    params = (("symbol", symbol.upper()), ("interval", interval), ("limit", limit))
+    return await fetch_kline(MARK_PRICE_KLINES_PATH, params, limit)
 
 
 # -------------------------- 4. get_latest_price --------------------------
 @app.get("/latest_price/{symbol}")
 async def get_latest_price(symbol: str):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/ticker/price", params={"symbol": symbol.upper()})
-        r.raise_for_status()
-        df = pd.DataFrame([r.json()])
-        df["price"] = df["price"].astype(float).round(8)
-        return {"markdown": to_md(df)}
+    d = await _fetch_price(symbol.upper())
+    return md_response(dict_to_md(_price_row(d), PRICE_MD_HEADER))
 
 
 # -------------------------- 5. get_price_change_statistics_24h --------------------------
 @app.get("/price_change_24h/{symbol}")
 async def get_price_change_statistics_24h(symbol: str):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/ticker/24hr", params={"symbol": symbol.upper()})
-        r.raise_for_status()
-        df = pd.DataFrame([r.json()])
-        df = df[["symbol", "priceChange", "priceChangePercent", "lastPrice", "volume"]]
-        df["priceChangePercent"] = df["priceChangePercent"].astype(float).round(2)
-        return {"markdown": to_md(df)}
+    d = await _fetch_24h(symbol.upper())
+    return md_response(dict_to_md(_ticker_24h_row(d), TICKER_24H_MD_HEADER))
 
 
 # -------------------------- 6. get_order_book_ticker --------------------------
 @app.get("/order_book_ticker/{symbol}")
 async def get_order_book_ticker(symbol: str):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/ticker/bookTicker", params={"symbol": symbol.upper()})
-        r.raise_for_status()
-        df = pd.DataFrame([r.json()])
-        df = df[["symbol", "bidPrice", "bidQty", "askPrice", "askQty"]]
-        return {"markdown": to_md(df)}
+    d = await _fetch_symbol(BOOK_TICKER_PATH, symbol.upper())
+    return md_response(dict_to_md(_book_ticker_row(d), BOOK_TICKER_MD_HEADER))
 
 
 # -------------------------- 7. get_order_book --------------------------
 @app.get("/order_book/{symbol}")
 async def get_order_book(symbol: str, limit: int = 5):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/depth", params={"symbol": symbol.upper(), "limit": limit})
-        r.raise_for_status()
-        data = r.json()
-        bids = pd.DataFrame(data["bids"], columns=["price", "quantity"])
-        bids["side"] = "bid"
-        asks = pd.DataFrame(data["asks"], columns=["price", "quantity"])
-        asks["side"] = "ask"
-        df = pd.concat([bids, asks])
-        df["price"] = df["price"].astype(float).round(8)
-        df["quantity"] = df["quantity"].astype(float).round(8)
-        return {"markdown": to_md(df[["side", "price", "quantity"]])}
+    params = (("symbol", symbol.upper()), ("limit", limit))
+    return await fetch_table(DEPTH_PATH, params, _format_order_book, limit)
 
 
 # -------------------------- 8. get_recent_trades --------------------------
 @app.get("/recent_trades/{symbol}")
 async def get_recent_trades(symbol: str, limit: int = 2):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/trades", params={"symbol": symbol.upper(), "limit": limit})
-        r.raise_for_status()
-        df = pd.DataFrame(r.json())
-        df["time"] = pd.to_datetime(df["time"], unit="ms")
-        df = df.rename(columns={"id": "tradeId"})
-        df = df[["tradeId", "price", "qty", "quoteQty", "time", "isBuyerMaker"]]
-        return {"markdown": to_md(df)}
+    params = (("symbol", symbol.upper()), ("limit", limit))
+    return await fetch_table(TRADES_PATH, params, TRADE_SPEC.format, limit)
 
 
 # -------------------------- 9. get_historical_trades --------------------------
@@ -152,89 +548,85 @@ async def get_historical_trades(
     limit: Optional[int] = 2,
     x_api_key: Optional[str] = Header(None)
 ):
-    params = {"symbol": symbol.upper()}
+    params = [("symbol", symbol.upper())]
     if fromId is not None:
-        params["fromId"] = fromId
+        params.append(("fromId", fromId))
     if limit is not None:
-        params["limit"] = limit
-    headers = {"X-MBX-APIKEY": x_api_key or API_KEY} if (x_api_key or API_KEY) else {}
+        params.append(("limit", limit))
+    headers = {"X-MBX-APIKEY": x_api_key} if x_api_key else _AUTH_HEADERS
 
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get(f"{BASE_URL}/fapi/v1/historicalTrades", params=params, headers=headers)
-            r.raise_for_status()
-            df = pd.DataFrame(r.json())
-            df["time"] = pd.to_datetime(df["time"], unit="ms")
-            df = df.rename(columns={"id": "tradeId"})
-            df = df[["tradeId", "price", "qty", "quoteQty", "time", "isBuyerMaker"]]
-            return {"markdown": to_md(df)}
-        except httpx.HTTPStatusError as e:
-            return {"error": f"HTTP Error {e.response.status_code}: {e.response.text}"}
-        except Exception as e:
-            return {"error": str(e)}
+    try:
+        return await fetch_table(HISTORICAL_TRADES_PATH, params, TRADE_SPEC.format, limit or 0, headers)
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
+        return {"error": f"HTTP Error {e.response.status_code}: {e.response.text}"}
+    except Exception as e:
+        return {"error": str(e)}
 
 
 # -------------------------- 10. get_aggregated_trades --------------------------
 @app.get("/aggregated_trades/{symbol}")
 async def get_aggregated_trades(symbol: str, fromId: Optional[int] = None, limit: int = 2):
-    params = {"symbol": symbol.upper(), "limit": limit}
+    params = [("symbol", symbol.upper()), ("limit", limit)]
     if fromId:
-        params["fromId"] = fromId
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/aggTrades", params=params)
-        r.raise_for_status()
-        df = pd.DataFrame(r.json())
-        df["T"] = pd.to_datetime(df["T"], unit="ms")
-        df = df.rename(columns={
-            "a": "aggTradeId",
-            "p": "price",
-            "q": "qty",
-            "f": "firstTradeId",
-            "l": "lastTradeId",
-            "T": "time",
-            "m": "isBuyerMaker"
-        })
-        df = df[["aggTradeId", "price", "qty", "firstTradeId", "lastTradeId", "time", "isBuyerMaker"]]
-        return {"markdown": to_md(df)}
+        params.append(("fromId", fromId))
+    return await fetch_table(AGG_TRADES_PATH, params, AGG_TRADE_SPEC.format, limit)
 
 
 # -------------------------- 11. get_premium_index --------------------------
 @app.get("/premium_index/{symbol}")
 async def get_premium_index(symbol: str):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/premiumIndex", params={"symbol": symbol.upper()})
-        r.raise_for_status()
-        df = pd.DataFrame([r.json()])
-        df["nextFundingTime"] = pd.to_datetime(df["nextFundingTime"], unit="ms")
-        df = df[["symbol", "markPrice", "indexPrice", "lastFundingRate", "nextFundingTime"]]
-        return {"markdown": to_md(df)}
+    d = await _fetch_symbol(PREMIUM_INDEX_PATH, symbol.upper())
+    return md_response(dict_to_md(_premium_row(d), PREMIUM_MD_HEADER))
 
 
 # -------------------------- 12. get_funding_rate_history --------------------------
 @app.get("/funding_rate_history/{symbol}")
 async def get_funding_rate_history(symbol: str, limit: int = 2):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/fundingRate", params={"symbol": symbol.upper(), "limit": limit})
-        r.raise_for_status()
-        df = pd.DataFrame(r.json())
-        df["fundingTime"] = pd.to_datetime(df["fundingTime"], unit="ms")
-        df = df[["symbol", "fundingTime", "fundingRate"]]
-        return {"markdown": to_md(df)}
+    params = (("symbol", symbol.upper()), ("limit", limit))
+    return await fetch_table(FUNDING_RATE_PATH, params, FUNDING_SPEC.format, limit)
 
 
 # -------------------------- 13. get_price_index_kline --------------------------
 @app.get("/price_index_kline/{symbol}")
 async def get_price_index_kline(symbol: str, interval: str = "1h", limit: int = 2):
-    params = {"symbol": symbol.upper(), "interval": interval, "limit": limit}
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{BASE_URL}/fapi/v1/markPriceKlines", params=params)
-        r.raise_for_status()
-        df = pd.DataFrame(r.json())
-        return {"markdown": to_md(df.head(5))}
+    params = (("symbol", symbol.upper()), ("interval", interval), ("limit", limit))
+    return await fetch_table(MARK_PRICE_KLINES_PATH, params, _format_raw_head, limit)
+
+
+# -------------------------- 14. batch_latest_price --------------------------
+@app.get("/batch/latest_price")
+async def batch_latest_price(symbols: str):
+    # One all-symbols request (weight 2) beats a call per symbol; symbols missing
+    # from the snapshot still fall back to their own request
+    await _fetch_all_prices()
+    return md_response(await _batch_md(_fetch_price, symbols, _price_row, PRICE_MD_HEADER))
+
+
+# -------------------------- 15. batch_premium_index --------------------------
+@app.get("/batch/premium_index")
+async def batch_premium_index(symbols: str):
+    return md_response(await _batch_md(partial(_fetch_symbol, PREMIUM_INDEX_PATH), symbols, _premium_row, PREMIUM_MD_HEADER))
+
+
+# -------------------------- 16. batch_order_book_ticker --------------------------
+@app.get("/batch/order_book_ticker")
+async def batch_order_book_ticker(symbols: str):
+    return md_response(await _batch_md(partial(_fetch_symbol, BOOK_TICKER_PATH), symbols, _book_ticker_row, BOOK_TICKER_MD_HEADER))
+
+
+# -------------------------- 17. get_all_latest_prices --------------------------
+@app.get("/latest_price")
+async def get_all_latest_prices():
+    prices = await _fetch_all_prices()
+    return md_response(rows_to_md(PRICE_MD_HEADER, (_price_row(d).values() for d in prices.values())))
 
 
 # -------------------------- Run Server --------------------------
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))  # ✅ Render will inject PORT
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # One worker unless asked: os.cpu_count() reports host cores, not the
+    # container's CPU quota, and every worker keeps its own caches
+    uvicorn.run("main:app", host="0.0.0.0", port=port, loop="uvloop", http="httptools", workers=WORKERS)